@@ -1,8 +1,9 @@
 from models import Difficulty
 
 class AdaptiveEngine:
-    def __init__(self):
-        self.user_sessions = {}  # Store user session data
+    def __init__(self, user_sessions=None):
+        # Store user session data; pass a SessionCache to bound memory use
+        self.user_sessions = user_sessions if user_sessions is not None else {}
     
     def initialize_user_session(self, user_id: str, initial_difficulty: Difficulty = Difficulty.MEDIUM):
         """Initialize a new user session"""
@@ -0,0 +1,66 @@
+import asyncio
+from collections import OrderedDict
+
+
+class Subscription:
+    """Bounded, coalescing queue of progress deltas for one subscriber.
+
+    Deltas are keyed by user id, so a newer update for a student replaces one
+    that has not been delivered yet. If more than ``max_pending`` students are
+    waiting, the oldest pending update is dropped. Publishing never blocks.
+    """
+
+    def __init__(self, class_id: str, max_pending: int):
+        self.class_id = class_id
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+        self.dropped = 0
+
+    def push(self, user_id: str, delta: dict):
+        if user_id in self.pending:
+            self.coalesced += 1
+            self.pending.move_to_end(user_id)
+        self.pending[user_id] = delta
+        if len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.ready.set()
+
+    async def get(self, timeout: float = None) -> list:
+        """Wait for pending deltas and take all of them; empty list on timeout"""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        deltas = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        return deltas
+
+
+class ClassEventBus:
+    """In-process fan-out of answer deltas to the subscribers of each class"""
+
+    def __init__(self, max_pending: int = 256):
+        self.max_pending = max_pending
+        self.subscribers = {}
+
+    def subscribe(self, class_id: str) -> Subscription:
+        subscription = Subscription(class_id, self.max_pending)
+        self.subscribers.setdefault(class_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.class_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.subscribers[subscription.class_id]
+
+    def publish(self, class_id: str, user_id: str, delta: dict):
+        for subscription in self.subscribers.get(class_id, ()):
+            subscription.push(user_id, delta)
@@ -0,0 +1,119 @@
+"""MessagePack request/response negotiation.
+
+Clients opt in per request: ``Content-Type: application/msgpack`` bodies are
+decoded before FastAPI validates them, and ``Accept: application/msgpack``
+switches the response encoding. Everything else stays JSON.
+"""
+from contextvars import ContextVar
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # JSON keeps working without it
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+_wants_msgpack = ContextVar("wants_msgpack", default=False)
+
+
+def _media_types(accept: str):
+    """Yield (media type, q) pairs from an Accept header"""
+    for part in accept.split(','):
+        fields = part.strip().split(';')
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        yield fields[0].strip().lower(), q
+
+
+def wants_msgpack(request: Request) -> bool:
+    """True if the client ranks MessagePack above JSON in its Accept header"""
+    if msgpack is None:
+        return False
+    accept = request.headers.get("accept")
+    if not accept:
+        return False
+    msgpack_q, json_q = 0.0, 0.0
+    for media_type, q in _media_types(accept):
+        if media_type in MSGPACK_TYPES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type == "application/json":
+            json_q = max(json_q, q)
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def is_msgpack_body(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "")
+    return content_type.split(';')[0].strip().lower() in MSGPACK_TYPES
+
+
+def packb(content) -> bytes:
+    return msgpack.packb(content, use_bin_type=True)
+
+
+class _DecodedRequest(Request):
+    """Request whose body was MessagePack and is presented to FastAPI as parsed JSON"""
+
+    def __init__(self, scope, receive, decoded):
+        super().__init__(scope, receive)
+        self._decoded = decoded
+
+    async def json(self):
+        return self._decoded
+
+
+class MsgPackRoute(APIRoute):
+    """Route that accepts MessagePack bodies and negotiates the response encoding"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def negotiating_handler(request: Request):
+            if is_msgpack_body(request):
+                if msgpack is None:
+                    raise HTTPException(status_code=415, detail="MessagePack support is not installed")
+                body = await request.body()
+                try:
+                    decoded = msgpack.unpackb(body, raw=False)
+                except (ValueError, msgpack.UnpackException):
+                    raise HTTPException(status_code=400, detail="Invalid MessagePack body")
+                # FastAPI only parses JSON content types, so present the decoded body as JSON
+                scope = dict(request.scope)
+                scope["headers"] = [
+                    (name, b"application/json" if name == b"content-type" else value)
+                    for name, value in request.scope["headers"]
+                ]
+                request = _DecodedRequest(scope, request.receive, decoded)
+                request._body = body
+
+            token = _wants_msgpack.set(wants_msgpack(request))
+            try:
+                return await handler(request)
+            finally:
+                _wants_msgpack.reset(token)
+
+        return negotiating_handler
+
+
+class NegotiatedResponse(JSONResponse):
+    """Default response class: JSON, or MessagePack when the client asked for it"""
+
+    def __init__(self, content=None, *args, **kwargs):
+        if _wants_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+        super().__init__(content, *args, **kwargs)
+        self.headers.append("Vary", "Accept")
+
+    def render(self, content) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return packb(content)
+        return super().render(content)
@@ -0,0 +1,581 @@
+import asyncio
+import glob
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from models import Difficulty
+from review_scheduler import ReviewScheduler
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on this platform
+    fcntl = None
+
+# Event types
+SESSION_STARTED = 1
+PUZZLE_ISSUED = 2
+ANSWER_SUBMITTED = 3
+SESSIONS_STARTED = 4
+
+# Record layout: payload length, crc32 of payload, event type, then payload
+_HEADER = struct.Struct('<IIB')
+_STR_LEN = struct.Struct('<H')
+_PUZZLE_FIELDS = struct.Struct('<d')
+_REVIEW_INTERVAL = struct.Struct('<H')
+_ANSWER_FIELDS = struct.Struct('<?dHH')
+_COUNT = struct.Struct('<I')
+
+_SEGMENT_PATTERN = "events-{:08d}.log"
+_SNAPSHOT_PATTERN = "snapshot-{:08d}.jsonl"
+_LOCK_NAME = "LOCK"
+
+
+class EncodeError(ValueError):
+    """Raised when request data cannot be represented in a log record"""
+
+
+class RecoveryError(RuntimeError):
+    """Raised when the snapshot and segments on disk cannot rebuild a consistent state"""
+
+
+class DirectoryLockedError(RuntimeError):
+    """Raised when another process already holds the log directory"""
+
+
+def _pack_str(value: str) -> bytes:
+    data = str(value).encode('utf-8')
+    return _STR_LEN.pack(len(data)) + data
+
+
+def _difficulty_value(difficulty) -> str:
+    return getattr(difficulty, 'value', difficulty)
+
+
+def _unpack_str(buf, offset: int):
+    (length,) = _STR_LEN.unpack_from(buf, offset)
+    offset += _STR_LEN.size
+    return bytes(buf[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def _resolve_future(future, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+def _segment_number(path: str) -> int:
+    return int(os.path.basename(path).split('-')[1].split('.')[0])
+
+
+def _record(event_type: int, encode_payload) -> bytes:
+    try:
+        payload = encode_payload()
+    except (struct.error, UnicodeEncodeError) as e:
+        raise EncodeError(str(e)) from e
+    return _HEADER.pack(len(payload), zlib.crc32(payload), event_type) + payload
+
+
+def encode_session_started(user_id: str, difficulty) -> bytes:
+    return _record(SESSION_STARTED, lambda: _pack_str(user_id) + _pack_str(_difficulty_value(difficulty)))
+
+
+def encode_sessions_started(class_id: str, sessions) -> bytes:
+    """Encode a batch of sessions provisioned together under ``class_id``"""
+    def payload():
+        parts = [_pack_str(class_id), _COUNT.pack(len(sessions))]
+        for user_id, difficulty in sessions:
+            parts.append(_pack_str(user_id))
+            parts.append(_pack_str(_difficulty_value(difficulty)))
+        return b''.join(parts)
+    return _record(SESSIONS_STARTED, payload)
+
+
+def encode_puzzle_issued(puzzle_id: str, user_id: str, difficulty: str, correct_answer: float,
+                         question: str = '', review_interval: int = 0) -> bytes:
+    return _record(PUZZLE_ISSUED, lambda: (
+        _pack_str(puzzle_id) + _pack_str(user_id) + _pack_str(difficulty)
+        + _PUZZLE_FIELDS.pack(correct_answer)
+        + _pack_str(question) + _REVIEW_INTERVAL.pack(review_interval)))
+
+
+def encode_answer_submitted(user_id: str, puzzle_id: str, is_correct: bool, response_time: float,
+                            difficulty: str, next_difficulty, consecutive_correct: int,
+                            consecutive_wrong: int) -> bytes:
+    """Encode an answer together with the session state it produced"""
+    return _record(ANSWER_SUBMITTED, lambda: (
+        _pack_str(user_id) + _pack_str(puzzle_id) + _pack_str(difficulty)
+        + _pack_str(_difficulty_value(next_difficulty))
+        + _ANSWER_FIELDS.pack(is_correct, response_time,
+                              min(consecutive_correct, 0xFFFF), min(consecutive_wrong, 0xFFFF))))
+
+
+class EventLog:
+    """Append-only binary log of session events with snapshots and compaction.
+
+    Appends are buffered in memory and made durable by a background thread that
+    writes and fsyncs everything buffered at once (group commit); records that
+    arrive during an fsync go out together in the next one. Callers that must not
+    acknowledge a write before it is durable await ``wait_committed``.
+
+    Every ``snapshot_every`` events the flusher starts a new log segment and a
+    compactor thread builds a snapshot by replaying the previous snapshot plus
+    the closed segments into private state, then deletes what it supersedes.
+    Live state is never read for a snapshot, so the event loop never stalls.
+    """
+
+    def __init__(self, directory: str, commit_interval: float = 0.05, snapshot_every: int = 10000,
+                 review_scheduler: ReviewScheduler = None, snapshot_max_resident: int = 10000):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.snapshot_max_resident = snapshot_max_resident
+        # Replay re-runs review scheduling, so it must match the live scheduler
+        self.review_scheduler = review_scheduler if review_scheduler is not None else ReviewScheduler()
+
+        self.sessions = None
+        self.puzzles = None
+        self.classes = None
+
+        self._buffer = bytearray()
+        self._buffer_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._file = None
+        self._lock_file = None
+        self._segment = 0
+        self._closed = threading.Event()
+        self._pending = threading.Event()
+        self._flusher = None
+        self._compactor = None
+        self._snapshot_requested = False
+
+        # Sequence numbers of appended and durably committed records, plus the
+        # (sequence, loop, future) of callers waiting for a commit
+        self._appended_seq = 0
+        self._committed_seq = 0
+        self._waiters = []
+
+        self.events_since_snapshot = 0
+        self.commits = 0
+        self.events_committed = 0
+        self._events_buffered = 0
+        self.replay_stats = {}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def load(self, sessions: dict, puzzles: dict, classes: dict = None, until_segment: int = None) -> int:
+        """Rebuild state from the latest snapshot plus the log tail without writing anything.
+
+        Only segments before ``until_segment`` are replayed when it is given.
+        Returns the segment number new events should be appended to.
+        """
+        self.sessions = sessions
+        self.puzzles = puzzles
+        self.classes = classes if classes is not None else {}
+
+        started = time.perf_counter()
+        snapshot_segment = self._load_latest_snapshot()
+        events, size = 0, 0
+        segments = self._segment_paths()
+        tail = [path for path in segments if _segment_number(path) >= snapshot_segment
+                and (until_segment is None or _segment_number(path) < until_segment)]
+        # Segments before a snapshot are compacted away, so the tail must pick up exactly where it ends
+        numbers = [_segment_number(path) for path in tail]
+        if numbers != list(range(snapshot_segment, snapshot_segment + len(numbers))):
+            raise RecoveryError(f"Log segments in {self.directory} do not continue from segment "
+                                f"{snapshot_segment}: found {numbers[:5]}")
+        for path in tail:
+            replayed, replayed_bytes = self._replay_segment(path)
+            events += replayed
+            size += replayed_bytes
+        elapsed = time.perf_counter() - started
+
+        self.replay_stats = {
+            'snapshot_segment': snapshot_segment,
+            'sessions_restored': len(self.sessions),
+            'events_replayed': events,
+            'bytes_replayed': size,
+            'replay_seconds': elapsed,
+            'events_per_second': events / elapsed if elapsed > 0 else 0.0,
+        }
+        self.events_since_snapshot = events
+
+        # Never append to a segment that may end in a torn record
+        last_segment = _segment_number(segments[-1]) if segments else snapshot_segment - 1
+        return max(last_segment + 1, snapshot_segment)
+
+    def lock(self):
+        """Take an exclusive lock on the log directory, failing fast if another process has it"""
+        if self._lock_file is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, _LOCK_NAME), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise DirectoryLockedError(f"{self.directory} is in use by another process")
+        self._lock_file = lock_file
+
+    def open(self, sessions: dict, puzzles: dict, classes: dict = None):
+        """Lock the directory, rebuild state from the latest snapshot plus the log tail, then start logging"""
+        self.lock()
+        self._open_segment(self.load(sessions, puzzles, classes))
+
+        self._closed.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="event-log-flusher", daemon=True)
+        self._flusher.start()
+
+    def close(self):
+        """Stop the background threads and commit anything still buffered"""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self._lock_file is not None:
+            # Closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    # ------------------------------------------------------------------
+    # Appending
+    # ------------------------------------------------------------------
+
+    # Handlers encode a record before changing any state, so a value that does not
+    # fit the record layout is rejected without leaving unlogged changes behind
+
+    def session_started(self, user_id: str, difficulty):
+        return self.append(encode_session_started(user_id, difficulty))
+
+    def sessions_started(self, class_id: str, sessions):
+        return self.append(encode_sessions_started(class_id, sessions))
+
+    def puzzle_issued(self, puzzle_id: str, user_id: str, difficulty: str, correct_answer: float,
+                      question: str = '', review_interval: int = 0):
+        return self.append(encode_puzzle_issued(puzzle_id, user_id, difficulty, correct_answer,
+                                                question, review_interval))
+
+    def answer_submitted(self, user_id: str, puzzle_id: str, is_correct: bool, response_time: float,
+                         difficulty: str, session: dict):
+        """Record an answer together with the session state it produced"""
+        return self.append(encode_answer_submitted(
+            user_id, puzzle_id, is_correct, response_time, difficulty, session['current_difficulty'],
+            session['consecutive_correct'], session['consecutive_wrong']))
+
+    def append(self, record: bytes) -> int:
+        """Buffer a record built by one of the ``encode_*`` functions and return its sequence number"""
+        with self._buffer_lock:
+            self._buffer += record
+            self._events_buffered += 1
+            self._appended_seq += 1
+            seq = self._appended_seq
+        self._pending.set()
+        self.events_since_snapshot += 1
+        if self.snapshot_every and self.events_since_snapshot >= self.snapshot_every:
+            # Only flag it here: the flusher rotates the segment and the compactor does the work
+            self._snapshot_requested = True
+            self.events_since_snapshot = 0
+        return seq
+
+    async def wait_committed(self, seq: int = None):
+        """Wait until record ``seq`` (default: everything appended so far) is durable"""
+        if seq is None:
+            seq = self._appended_seq
+        with self._buffer_lock:
+            if self._committed_seq >= seq:
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters.append((seq, loop, future))
+        await future
+
+    def is_committed(self, seq: int) -> bool:
+        """True if record ``seq`` is already durable"""
+        return self._committed_seq >= seq
+
+    def _notify_waiters(self, committed_seq: int, error: Exception = None):
+        with self._buffer_lock:
+            if error is None:
+                self._committed_seq = max(self._committed_seq, committed_seq)
+            ready = [waiter for waiter in self._waiters if waiter[0] <= committed_seq]
+            self._waiters = [waiter for waiter in self._waiters if waiter[0] > committed_seq]
+        for _, loop, future in ready:
+            loop.call_soon_threadsafe(_resolve_future, future, error)
+
+    def flush(self):
+        """Write and fsync every buffered record in a single commit"""
+        with self._io_lock:
+            self._commit_buffer()
+
+    def _commit_buffer(self):
+        # Caller holds _io_lock
+        with self._buffer_lock:
+            self._pending.clear()
+            if not self._buffer:
+                return
+            data = bytes(self._buffer)
+            events = self._events_buffered
+            seq = self._appended_seq
+            self._buffer.clear()
+            self._events_buffered = 0
+        try:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as error:
+            # Callers waiting on these records get the error instead of an acknowledgement
+            self._notify_waiters(seq, error)
+            raise
+        self.commits += 1
+        self.events_committed += events
+        self._notify_waiters(seq)
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._pending.wait(self.commit_interval)
+            try:
+                self.flush()
+            except OSError:
+                continue
+            if self._snapshot_requested and (self._compactor is None or not self._compactor.is_alive()):
+                self._snapshot_requested = False
+                self._start_snapshot()
+
+    # ------------------------------------------------------------------
+    # Snapshots and compaction
+    # ------------------------------------------------------------------
+
+    def _rotate(self) -> int:
+        """Commit the buffer, close the current segment and start the next one"""
+        with self._io_lock:
+            self._commit_buffer()
+            self._file.close()
+            self._open_segment(self._segment + 1)
+            return self._segment
+
+    def _start_snapshot(self):
+        segment = self._rotate()
+        self._compactor = threading.Thread(target=self._build_snapshot, args=(segment,),
+                                           name="event-log-compactor", daemon=True)
+        self._compactor.start()
+
+    def snapshot(self):
+        """Snapshot everything logged so far and drop the log it supersedes (blocking)"""
+        self._build_snapshot(self._rotate())
+
+    def _build_snapshot(self, segment: int):
+        """Replay the closed segments into private state and snapshot it at ``segment``"""
+        from session_cache import SessionCache
+
+        with tempfile.TemporaryDirectory() as spill_dir:
+            builder = EventLog(self.directory, review_scheduler=self.review_scheduler)
+            sessions = SessionCache(spill_dir, max_sessions=self.snapshot_max_resident)
+            builder.load(sessions, {}, {}, until_segment=segment)
+            builder._write_snapshot(segment)
+        self._compact(segment)
+
+    def _write_snapshot(self, segment: int):
+        """Write a JSON-lines snapshot: a header line, then one line per session"""
+        path = os.path.join(self.directory, _SNAPSHOT_PATTERN.format(segment))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            header = {'segment': segment, 'puzzles': self.puzzles, 'classes': self.classes}
+            f.write(json.dumps(header, separators=(',', ':')))
+            f.write('\n')
+            # Stream sessions one at a time so spilled sessions are never all in memory
+            for user_id, session in self.sessions.items():
+                f.write(json.dumps([user_id, session], separators=(',', ':')))
+                f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # The rename must be durable before compaction deletes what the snapshot replaces
+        self._fsync_directory()
+
+    def _compact(self, segment: int):
+        """Delete log segments and snapshots older than the snapshot at ``segment``"""
+        for path in self._segment_paths():
+            if _segment_number(path) < segment:
+                os.remove(path)
+        for path in self._snapshot_paths():
+            if _segment_number(path) < segment:
+                os.remove(path)
+
+    def _load_latest_snapshot(self) -> int:
+        """Load the newest readable snapshot; return the first segment it does not cover.
+
+        Falls back to an older snapshot when the newest cannot be read; ``load``
+        then checks that the segments it needs are still there.
+        """
+        paths = self._snapshot_paths()
+        for path in reversed(paths):
+            self.sessions.clear()
+            self.puzzles.clear()
+            self.classes.clear()
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    header = json.loads(f.readline())
+                    for line in f:
+                        user_id, session = json.loads(line)
+                        session['current_difficulty'] = Difficulty(session['current_difficulty'])
+                        self.sessions[user_id] = session
+            except (OSError, ValueError):
+                continue
+            self.puzzles.update(header['puzzles'])
+            self.classes.update(header.get('classes', {}))
+            return header['segment']
+        if paths:
+            raise RecoveryError(f"No readable snapshot in {self.directory}; refusing to start from the log tail")
+        self.sessions.clear()
+        self.puzzles.clear()
+        self.classes.clear()
+        return 0
+
+    # ------------------------------------------------------------------
+    # Replay
+    # ------------------------------------------------------------------
+
+    def _replay_segment(self, path: str):
+        """Apply every intact record in a segment; stop at the first torn one"""
+        size = os.path.getsize(path)
+        if size == 0:
+            return 0, 0
+
+        events = 0
+        offset = 0
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            while offset + _HEADER.size <= size:
+                length, crc, event_type = _HEADER.unpack_from(buf, offset)
+                start = offset + _HEADER.size
+                end = start + length
+                if end > size or zlib.crc32(buf[start:end]) != crc:
+                    break
+                self._apply(event_type, buf, start, end)
+                events += 1
+                offset = end
+        return events, offset
+
+    def _apply(self, event_type: int, buf, offset: int, end: int):
+        if event_type == SESSION_STARTED:
+            user_id, offset = _unpack_str(buf, offset)
+            difficulty, offset = _unpack_str(buf, offset)
+            self.sessions[user_id] = {
+                'current_difficulty': Difficulty(difficulty),
+                'performance_history': [],
+                'consecutive_correct': 0,
+                'consecutive_wrong': 0,
+                'version': 0
+            }
+        elif event_type == SESSIONS_STARTED:
+            class_id, offset = _unpack_str(buf, offset)
+            (count,) = _COUNT.unpack_from(buf, offset)
+            offset += _COUNT.size
+            members = self.classes.setdefault(class_id, [])
+            for _ in range(count):
+                user_id, offset = _unpack_str(buf, offset)
+                difficulty, offset = _unpack_str(buf, offset)
+                self.sessions[user_id] = {
+                    'current_difficulty': Difficulty(difficulty),
+                    'performance_history': [],
+                    'consecutive_correct': 0,
+                    'consecutive_wrong': 0,
+                    'version': 0,
+                    'class_id': class_id
+                }
+                members.append(user_id)
+        elif event_type == PUZZLE_ISSUED:
+            puzzle_id, offset = _unpack_str(buf, offset)
+            user_id, offset = _unpack_str(buf, offset)
+            difficulty, offset = _unpack_str(buf, offset)
+            (correct_answer,) = _PUZZLE_FIELDS.unpack_from(buf, offset)
+            offset += _PUZZLE_FIELDS.size
+            puzzle = {
+                'correct_answer': int(correct_answer) if correct_answer.is_integer() else correct_answer,
+                'user_id': user_id,
+                'difficulty': difficulty
+            }
+            # Question and review interval were appended later; older records stop here
+            if offset < end:
+                puzzle['question'], offset = _unpack_str(buf, offset)
+                (puzzle['review_interval'],) = _REVIEW_INTERVAL.unpack_from(buf, offset)
+                session = self.sessions.get(user_id)
+                if session is not None:
+                    self.review_scheduler.next_due_review(session)
+            self.puzzles[puzzle_id] = puzzle
+        elif event_type == ANSWER_SUBMITTED:
+            user_id, offset = _unpack_str(buf, offset)
+            puzzle_id, offset = _unpack_str(buf, offset)
+            difficulty, offset = _unpack_str(buf, offset)
+            next_difficulty, offset = _unpack_str(buf, offset)
+            is_correct, response_time, consecutive_correct, consecutive_wrong = \
+                _ANSWER_FIELDS.unpack_from(buf, offset)
+            puzzle = self.puzzles.pop(puzzle_id, None)
+            session = self.sessions.get(user_id)
+            if session is None:
+                return
+            session['performance_history'].append({
+                'is_correct': is_correct,
+                'response_time': response_time,
+                'difficulty': difficulty
+            })
+            session['current_difficulty'] = Difficulty(next_difficulty)
+            session['consecutive_correct'] = consecutive_correct
+            session['consecutive_wrong'] = consecutive_wrong
+            session['version'] = session.get('version', 0) + 1
+            if puzzle is not None:
+                self.review_scheduler.record_answer(session, puzzle, is_correct)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _open_segment(self, segment: int):
+        self._segment = segment
+        path = os.path.join(self.directory, _SEGMENT_PATTERN.format(segment))
+        self._file = open(path, 'ab')
+        self._fsync_directory()
+
+    def _fsync_directory(self):
+        """Make file creations, renames and deletions in the log directory durable"""
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, "events-*.log")), key=_segment_number)
+
+    def _snapshot_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, "snapshot-*.jsonl")), key=_segment_number)
+
+    def get_stats(self) -> dict:
+        """Replay throughput from startup plus live commit counters"""
+        return {
+            'replay': self.replay_stats,
+            'segment': self._segment,
+            'events_since_snapshot': self.events_since_snapshot,
+            'events_committed': self.events_committed,
+            'commit_waiters': len(self._waiters),
+            'snapshot_in_progress': self._compactor is not None and self._compactor.is_alive(),
+            'group_commits': self.commits,
+            'events_per_commit': self.events_committed / self.commits if self.commits else 0.0,
+        }
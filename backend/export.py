@@ -0,0 +1,158 @@
+"""Streaming export of per-answer history.
+
+The server streams CSV or Arrow IPC through ``/export/history``; run this module
+directly to write partitioned Parquet files from the event log on disk:
+
+    python export.py --output exports/
+"""
+import argparse
+import csv
+import io
+import os
+import tempfile
+
+EXPORT_COLUMNS = ['user_id', 'question_number', 'is_correct', 'response_time', 'difficulty']
+BATCH_ROWS = 4096
+
+
+def iter_row_batches(sessions, batch_rows: int = BATCH_ROWS):
+    """Yield lists of at most ``batch_rows`` answer rows, reading one session at a time"""
+    batch = []
+    for user_id, session in sessions.items():
+        for number, entry in enumerate(session['performance_history'], start=1):
+            difficulty = getattr(entry['difficulty'], 'value', entry['difficulty'])
+            batch.append((user_id, number, entry['is_correct'], entry['response_time'], difficulty))
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv_chunks(sessions, batch_rows: int = BATCH_ROWS):
+    """Yield the answer history as CSV text, one chunk per row batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for batch in iter_row_batches(sessions, batch_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('user_id', pa.string()),
+        ('question_number', pa.int32()),
+        ('is_correct', pa.bool_()),
+        ('response_time', pa.float64()),
+        ('difficulty', pa.string()),
+    ])
+
+
+def to_record_batch(batch, schema):
+    import pyarrow as pa
+    columns = list(zip(*batch))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def iter_arrow_chunks(sessions, batch_rows: int = BATCH_ROWS):
+    """Yield the answer history as an Arrow IPC stream, one record batch per chunk"""
+    import pyarrow as pa
+    schema = arrow_schema()
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    yield drain()
+    for batch in iter_row_batches(sessions, batch_rows):
+        writer.write_batch(to_record_batch(batch, schema))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+def write_parquet(sessions, output_dir: str, batch_rows: int = BATCH_ROWS, rows_per_file: int = 1_000_000) -> dict:
+    """Write the answer history as Parquet files partitioned by difficulty.
+
+    Files are laid out Hive-style (``difficulty=EASY/part-00000.parquet``) and
+    rolled over every ``rows_per_file`` rows. The difficulty lives only in the
+    directory name, so ``pyarrow.parquet.read_table(output_dir)`` reads the
+    files back as one dataset. Returns rows written per partition.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # The partition column is encoded in the path, not stored in the files
+    schema = arrow_schema().remove(EXPORT_COLUMNS.index('difficulty'))
+    writers = {}
+    rows_in_file = {}
+    file_index = {}
+    rows_written = {}
+
+    def open_writer(difficulty):
+        directory = os.path.join(output_dir, f"difficulty={difficulty}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{file_index[difficulty]:05d}.parquet")
+        writers[difficulty] = pq.ParquetWriter(path, schema)
+        rows_in_file[difficulty] = 0
+
+    try:
+        for batch in iter_row_batches(sessions, batch_rows):
+            partitions = {}
+            for row in batch:
+                partitions.setdefault(row[4], []).append(row[:4])
+            for difficulty, rows in partitions.items():
+                if difficulty not in writers:
+                    file_index[difficulty] = 0
+                    rows_written[difficulty] = 0
+                    open_writer(difficulty)
+                elif rows_in_file[difficulty] >= rows_per_file:
+                    writers[difficulty].close()
+                    file_index[difficulty] += 1
+                    open_writer(difficulty)
+                writers[difficulty].write_table(pa.Table.from_batches([to_record_batch(rows, schema)]))
+                rows_in_file[difficulty] += len(rows)
+                rows_written[difficulty] += len(rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return rows_written
+
+
+def main():
+    from event_log import EventLog
+    from session_cache import SessionCache
+
+    parser = argparse.ArgumentParser(description="Export answer history to partitioned Parquet files")
+    parser.add_argument("--data-dir", default=os.environ.get("MATH_ADVENTURES_DATA_DIR", "data"),
+                        help="Event log directory to read from")
+    parser.add_argument("--output", required=True, help="Directory to write Parquet files to")
+    parser.add_argument("--rows-per-file", type=int, default=1_000_000)
+    parser.add_argument("--max-resident-sessions", type=int, default=1000,
+                        help="Sessions kept in RAM while rebuilding state; the rest spill to a temp dir")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        sessions = SessionCache(spill_dir, max_sessions=args.max_resident_sessions)
+        EventLog(args.data_dir).load(sessions, {})
+        rows_written = write_parquet(sessions, args.output, rows_per_file=args.rows_per_file)
+
+    for difficulty, rows in sorted(rows_written.items()):
+        print(f"difficulty={difficulty}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,62 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import os
 import random
 import uuid
-from models import *
+from models import Difficulty
+from review_scheduler import ReviewScheduler
+from event_log import EventLog, EncodeError, encode_answer_submitted, encode_puzzle_issued, encode_sessions_started
+from session_cache import SessionCache, SummaryCache
+from class_events import ClassEventBus
+from content_negotiation import MsgPackRoute, NegotiatedResponse, MSGPACK_MEDIA_TYPE, packb, wants_msgpack
+import export
 
-app = FastAPI(title="Math Adventures API", version="1.0.0")
+# Event log configuration
+DATA_DIR = os.environ.get("MATH_ADVENTURES_DATA_DIR", "data")
+COMMIT_INTERVAL = float(os.environ.get("MATH_ADVENTURES_COMMIT_INTERVAL", "0.05"))
+SNAPSHOT_EVERY = int(os.environ.get("MATH_ADVENTURES_SNAPSHOT_EVERY", "10000"))
+
+# Session cache configuration
+MAX_RESIDENT_SESSIONS = int(os.environ.get("MATH_ADVENTURES_MAX_RESIDENT_SESSIONS", "10000"))
+MAX_RESIDENT_BYTES = int(os.environ.get("MATH_ADVENTURES_MAX_RESIDENT_BYTES", str(256 * 1024 * 1024)))
+# Share of the resident budget kept for serialized session summaries
+MAX_SUMMARY_BYTES = int(os.environ.get("MATH_ADVENTURES_MAX_SUMMARY_BYTES", str(MAX_RESIDENT_BYTES // 8)))
+IDLE_SESSION_SECONDS = float(os.environ.get("MATH_ADVENTURES_IDLE_SESSION_SECONDS", "1800"))
+IDLE_SWEEP_INTERVAL = float(os.environ.get("MATH_ADVENTURES_IDLE_SWEEP_INTERVAL", "60"))
+
+# Largest class that can be provisioned in one /start-sessions call
+MAX_BULK_SESSIONS = int(os.environ.get("MATH_ADVENTURES_MAX_BULK_SESSIONS", "1000"))
+
+# Live class progress stream configuration
+SUBSCRIBER_MAX_PENDING = int(os.environ.get("MATH_ADVENTURES_SUBSCRIBER_MAX_PENDING", "256"))
+KEEPALIVE_SECONDS = float(os.environ.get("MATH_ADVENTURES_KEEPALIVE_SECONDS", "15"))
+
+async def sweep_idle_sessions():
+    """Periodically move idle learners out of RAM"""
+    while True:
+        await asyncio.sleep(IDLE_SWEEP_INTERVAL)
+        user_sessions.sweep_idle(IDLE_SESSION_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast if another process owns the data dir, before touching its spilled sessions
+    event_log.lock()
+    user_sessions.clear()
+    # Rebuild in-memory state from the latest snapshot plus the log tail
+    event_log.open(user_sessions, active_puzzles, class_sessions)
+    sweeper = asyncio.create_task(sweep_idle_sessions())
+    yield
+    sweeper.cancel()
+    event_log.close()
+
+app = FastAPI(title="Math Adventures API", version="1.0.0", lifespan=lifespan,
+              default_response_class=NegotiatedResponse)
+# Every route accepts MessagePack bodies and honours Accept: application/msgpack
+app.router.route_class = MsgPackRoute
 
 # Add CORS middleware
 app.add_middleware(
@@ -16,13 +68,19 @@ app.add_middleware(
 )
 
 # Simple in-memory storage
-user_sessions = {}
+# Serialized session summaries; an entry is dropped as soon as its session changes
+summary_cache = SummaryCache(max_bytes=MAX_SUMMARY_BYTES)
+user_sessions = SessionCache(os.path.join(DATA_DIR, "spill"),
+                             max_sessions=MAX_RESIDENT_SESSIONS,
+                             max_bytes=MAX_RESIDENT_BYTES - MAX_SUMMARY_BYTES,
+                             on_spill=summary_cache.drop_bodies)
 active_puzzles = {}
-
-class Difficulty(str, Enum):
-    EASY = "EASY"
-    MEDIUM = "MEDIUM"
-    HARD = "HARD"
+# User ids grouped by class id, so class queries never scan every session
+class_sessions = {}
+class_events = ClassEventBus(max_pending=SUBSCRIBER_MAX_PENDING)
+review_scheduler = ReviewScheduler()
+event_log = EventLog(DATA_DIR, commit_interval=COMMIT_INTERVAL, snapshot_every=SNAPSHOT_EVERY,
+                     review_scheduler=review_scheduler)
 
 @app.post("/start-session")
 async def start_session(difficulty: Difficulty = Difficulty.MEDIUM):
@@ -32,8 +90,11 @@ async def start_session(difficulty: Difficulty = Difficulty.MEDIUM):
         'current_difficulty': difficulty,
         'performance_history': [],
         'consecutive_correct': 0,
-        'consecutive_wrong': 0
+        'consecutive_wrong': 0,
+        'version': 0
     }
+    # Acknowledge only once the session is durable
+    await event_log.wait_committed(event_log.session_started(user_id, difficulty))
     
     return {
         "user_id": user_id,
@@ -41,72 +102,191 @@ async def start_session(difficulty: Difficulty = Difficulty.MEDIUM):
         "initial_difficulty": difficulty
     }
 
+def bulk_user_ids(count: int) -> list:
+    """Generate ``count`` random UUID4 strings from a single urandom read"""
+    raw = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, len(raw), 16)]
+
+@app.post("/start-sessions")
+async def start_sessions(request: dict):
+    """Start sessions for a whole class in one call"""
+    class_id = request.get('class_id') or str(uuid.uuid4())
+    if not isinstance(class_id, str):
+        raise HTTPException(status_code=400, detail="class_id must be a string")
+    difficulties = request.get('difficulties')
+    if difficulties is None:
+        try:
+            count = int(request.get('count', 0))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="count must be an integer")
+        if count > MAX_BULK_SESSIONS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_SESSIONS} sessions per request")
+        difficulties = [request.get('difficulty', 'MEDIUM')] * count
+    elif not isinstance(difficulties, list):
+        raise HTTPException(status_code=400, detail="difficulties must be a list")
+    
+    if not difficulties:
+        raise HTTPException(status_code=400, detail="No sessions requested")
+    if len(difficulties) > MAX_BULK_SESSIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_SESSIONS} sessions per request")
+    try:
+        difficulties = [Difficulty(difficulty) for difficulty in difficulties]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid difficulty")
+    
+    user_ids = bulk_user_ids(len(difficulties))
+    # Encode first: a class_id that does not fit the log record is rejected before anything changes
+    try:
+        record = encode_sessions_started(class_id, list(zip(user_ids, difficulties)))
+    except EncodeError:
+        raise HTTPException(status_code=400, detail="Invalid class_id: it must encode to at most 65535 UTF-8 bytes")
+    user_sessions.update({
+        user_id: {
+            'current_difficulty': difficulty,
+            'performance_history': [],
+            'consecutive_correct': 0,
+            'consecutive_wrong': 0,
+            'version': 0,
+            'class_id': class_id
+        }
+        for user_id, difficulty in zip(user_ids, difficulties)
+    })
+    class_sessions.setdefault(class_id, []).extend(user_ids)
+    await event_log.wait_committed(event_log.append(record))
+    
+    return {
+        "class_id": class_id,
+        "user_ids": user_ids,
+        "initial_difficulties": difficulties,
+        "message": f"{len(user_ids)} sessions started successfully"
+    }
+
+@app.get("/class/{class_id}/sessions")
+async def get_class_sessions(class_id: str):
+    """Get a progress overview of every session in a class"""
+    if class_id not in class_sessions:
+        raise HTTPException(status_code=404, detail="Class not found")
+    
+    students = []
+    for user_id in class_sessions[class_id]:
+        session = user_sessions.get(user_id)
+        if session is None:
+            continue
+        history = session['performance_history']
+        correct_answers = sum(1 for h in history if h['is_correct'])
+        students.append({
+            "user_id": user_id,
+            "total_questions": len(history),
+            "correct_answers": correct_answers,
+            "accuracy": correct_answers / len(history) if history else 0,
+            "current_difficulty": session['current_difficulty']
+        })
+    
+    return {"class_id": class_id, "students": students}
+
+@app.get("/class/{class_id}/events")
+async def stream_class_events(class_id: str):
+    """Stream live progress deltas for a class as server-sent events"""
+    if class_id not in class_sessions:
+        raise HTTPException(status_code=404, detail="Class not found")
+    
+    async def event_stream():
+        subscription = class_events.subscribe(class_id)
+        try:
+            while True:
+                deltas = await subscription.get(timeout=KEEPALIVE_SECONDS)
+                if deltas:
+                    yield f"event: progress\ndata: {json.dumps(deltas, separators=(',', ':'))}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            class_events.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/get-puzzle")
 async def get_puzzle(request: dict):
     """Get a new math puzzle"""
     user_id = request.get('user_id')
-    difficulty = request.get('difficulty', 'MEDIUM')
+    try:
+        difficulty = Difficulty(request.get('difficulty') or 'MEDIUM').value
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid difficulty")
     
     if user_id not in user_sessions:
         raise HTTPException(status_code=404, detail="User session not found")
     
-    # Generate puzzle based on difficulty
-    if difficulty == "EASY":
-        a, b = random.randint(1, 10), random.randint(1, 10)
-        operation = random.choice(['+', '-'])
-        if operation == '+':
-            question = f"{a} + {b} = ?"
-            answer = a + b
-        else:
-            a, b = max(a, b), min(a, b)
-            question = f"{a} - {b} = ?"
-            answer = a - b
+    # Bring back a missed puzzle if one is due, otherwise generate a fresh one
+    review = review_scheduler.next_due_review(user_sessions[user_id])
+    if review is not None:
+        _, question, answer, difficulty, review_interval = review
+    else:
+        if difficulty == "EASY":
+            a, b = random.randint(1, 10), random.randint(1, 10)
+            operation = random.choice(['+', '-'])
+            if operation == '+':
+                question = f"{a} + {b} = ?"
+                answer = a + b
+            else:
+                a, b = max(a, b), min(a, b)
+                question = f"{a} - {b} = ?"
+                answer = a - b
             
-    elif difficulty == "MEDIUM":
-        a, b = random.randint(10, 50), random.randint(10, 50)
-        operation = random.choice(['+', '-', '*'])
-        if operation == '+':
-            question = f"{a} + {b} = ?"
-            answer = a + b
-        elif operation == '-':
-            a, b = max(a, b), min(a, b)
-            question = f"{a} - {b} = ?"
-            answer = a - b
-        else:
-            a, b = random.randint(2, 12), random.randint(2, 12)
-            question = f"{a} × {b} = ?"
-            answer = a * b
-    else:  # HARD
-        a, b = random.randint(50, 100), random.randint(50, 100)
-        operation = random.choice(['+', '-', '*', '/'])
-        if operation == '+':
-            question = f"{a} + {b} = ?"
-            answer = a + b
-        elif operation == '-':
-            a, b = max(a, b), min(a, b)
-            question = f"{a} - {b} = ?"
-            answer = a - b
-        elif operation == '*':
-            question = f"{a} × {b} = ?"
-            answer = a * b
-        else:  # division
-            b = random.randint(2, 12)
-            answer = random.randint(2, 12)
-            a = b * answer
-            question = f"{a} ÷ {b} = ?"
+        elif difficulty == "MEDIUM":
+            a, b = random.randint(10, 50), random.randint(10, 50)
+            operation = random.choice(['+', '-', '*'])
+            if operation == '+':
+                question = f"{a} + {b} = ?"
+                answer = a + b
+            elif operation == '-':
+                a, b = max(a, b), min(a, b)
+                question = f"{a} - {b} = ?"
+                answer = a - b
+            else:
+                a, b = random.randint(2, 12), random.randint(2, 12)
+                question = f"{a} × {b} = ?"
+                answer = a * b
+        else:  # HARD
+            a, b = random.randint(50, 100), random.randint(50, 100)
+            operation = random.choice(['+', '-', '*', '/'])
+            if operation == '+':
+                question = f"{a} + {b} = ?"
+                answer = a + b
+            elif operation == '-':
+                a, b = max(a, b), min(a, b)
+                question = f"{a} - {b} = ?"
+                answer = a - b
+            elif operation == '*':
+                question = f"{a} × {b} = ?"
+                answer = a * b
+            else:  # division
+                b = random.randint(2, 12)
+                answer = random.randint(2, 12)
+                a = b * answer
+                question = f"{a} ÷ {b} = ?"
+        review_interval = 0
     
     puzzle_id = str(uuid.uuid4())[:8]
+    record = encode_puzzle_issued(puzzle_id, user_id, difficulty, answer, question, review_interval)
     active_puzzles[puzzle_id] = {
         'correct_answer': answer,
         'user_id': user_id,
-        'difficulty': difficulty
+        'difficulty': difficulty,
+        'question': question,
+        'review_interval': review_interval
     }
+    await event_log.wait_committed(event_log.append(record))
     
     return {
         "question": question,
         "correct_answer": answer,
         "difficulty": difficulty,
-        "puzzle_id": puzzle_id
+        "puzzle_id": puzzle_id,
+        "is_review": review is not None
     }
 
 @app.post("/submit-answer")
@@ -114,11 +294,17 @@ async def submit_answer(request: dict):
     """Submit an answer and get adaptive response"""
     user_id = request.get('user_id')
     puzzle_id = request.get('puzzle_id')
-    user_answer = request.get('user_answer')
-    response_time = request.get('response_time', 0)
+    response_time = request.get('response_time')
+    try:
+        user_answer = float(request.get('user_answer'))
+        response_time = float(response_time) if response_time is not None else 0.0
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="user_answer and response_time must be numbers")
     
     if puzzle_id not in active_puzzles:
         raise HTTPException(status_code=404, detail="Puzzle not found")
+    if user_id not in user_sessions:
+        raise HTTPException(status_code=404, detail="User session not found")
     
     puzzle_data = active_puzzles[puzzle_id]
     correct_answer = puzzle_data['correct_answer']
@@ -126,35 +312,56 @@ async def submit_answer(request: dict):
     # Check answer (with tolerance for floating point)
     is_correct = abs(user_answer - correct_answer) < 0.001
     
-    # Update user session
     session = user_sessions[user_id]
-    session['performance_history'].append({
-        'is_correct': is_correct,
-        'response_time': response_time,
-        'difficulty': puzzle_data['difficulty']
-    })
+    consecutive_correct = session['consecutive_correct']
+    consecutive_wrong = session['consecutive_wrong']
+    next_difficulty = session['current_difficulty']
     
     # Simple adaptive logic
     if is_correct:
-        session['consecutive_correct'] += 1
-        session['consecutive_wrong'] = 0
-        if session['consecutive_correct'] >= 2 and response_time < 8:
+        consecutive_correct += 1
+        consecutive_wrong = 0
+        if consecutive_correct >= 2 and response_time < 8:
             # Increase difficulty
             difficulties = [Difficulty.EASY, Difficulty.MEDIUM, Difficulty.HARD]
-            current_index = difficulties.index(session['current_difficulty'])
+            current_index = difficulties.index(next_difficulty)
             if current_index < len(difficulties) - 1:
-                session['current_difficulty'] = difficulties[current_index + 1]
-                session['consecutive_correct'] = 0
+                next_difficulty = difficulties[current_index + 1]
+                consecutive_correct = 0
     else:
-        session['consecutive_wrong'] += 1
-        session['consecutive_correct'] = 0
-        if session['consecutive_wrong'] >= 2:
+        consecutive_wrong += 1
+        consecutive_correct = 0
+        if consecutive_wrong >= 2:
             # Decrease difficulty
             difficulties = [Difficulty.EASY, Difficulty.MEDIUM, Difficulty.HARD]
-            current_index = difficulties.index(session['current_difficulty'])
+            current_index = difficulties.index(next_difficulty)
             if current_index > 0:
-                session['current_difficulty'] = difficulties[current_index - 1]
-                session['consecutive_wrong'] = 0
+                next_difficulty = difficulties[current_index - 1]
+                consecutive_wrong = 0
+    
+    # Encode the log record before touching any state, so a rejected answer leaves nothing behind
+    try:
+        record = encode_answer_submitted(user_id, puzzle_id, is_correct, response_time, puzzle_data['difficulty'],
+                                         next_difficulty, consecutive_correct, consecutive_wrong)
+    except EncodeError:
+        raise HTTPException(status_code=400, detail="Answer cannot be recorded")
+    
+    # Update user session
+    session['performance_history'].append({
+        'is_correct': is_correct,
+        'response_time': response_time,
+        'difficulty': puzzle_data['difficulty']
+    })
+    session['current_difficulty'] = next_difficulty
+    session['consecutive_correct'] = consecutive_correct
+    session['consecutive_wrong'] = consecutive_wrong
+    
+    # Schedule missed puzzles for spaced review
+    review_scheduler.record_answer(session, puzzle_data, is_correct)
+    
+    # Invalidate cached summaries for this session
+    session['version'] = session.get('version', 0) + 1
+    summary_cache.discard(user_id)
     
     # Calculate stats
     history = session['performance_history']
@@ -164,31 +371,36 @@ async def submit_answer(request: dict):
     
     # Clean up
     del active_puzzles[puzzle_id]
+    # Summary polls only wait for this sequence number, not for every user's writes
+    session['commit_seq'] = event_log.append(record)
+    await event_log.wait_committed(session['commit_seq'])
+    
+    # Push a compact delta to teachers watching this student's class
+    if session.get('class_id') is not None:
+        class_events.publish(session['class_id'], user_id, {
+            "user_id": user_id,
+            "is_correct": is_correct,
+            "difficulty": next_difficulty,
+            "total": total_questions,
+            "correct": correct_answers
+        })
     
     return {
         "is_correct": is_correct,
         "correct_answer": correct_answer,
-        "next_difficulty": session['current_difficulty'],
+        "next_difficulty": next_difficulty,
         "performance_stats": {
             "total_questions": total_questions,
             "correct_answers": correct_answers,
             "accuracy": accuracy,
-            "current_difficulty": session['current_difficulty']
+            "current_difficulty": next_difficulty
         }
     }
 
-@app.get("/session-summary/{user_id}")
-async def get_session_summary(user_id: str):
-    """Get comprehensive session summary"""
-    if user_id not in user_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    session = user_sessions[user_id]
+def build_session_summary(user_id: str, session: dict) -> dict:
+    """Build the summary report for a session with at least one answer"""
     history = session['performance_history']
     
-    if not history:
-        raise HTTPException(status_code=400, detail="No performance data available")
-    
     total_questions = len(history)
     correct_answers = sum(1 for h in history if h['is_correct'])
     accuracy = correct_answers / total_questions
@@ -212,6 +424,98 @@ async def get_session_summary(user_id: str):
         "recommendation": recommendation
     }
 
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag"""
+    if if_none_match is None:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+@app.get("/session-summary/{user_id}")
+async def get_session_summary(user_id: str, request: Request):
+    """Get comprehensive session summary"""
+    # Each representation is serialized at most once per version and gets its own ETag
+    if wants_msgpack(request):
+        media_type, tag_suffix = MSGPACK_MEDIA_TYPE, "-msgpack"
+    else:
+        media_type, tag_suffix = "application/json", ""
+    
+    # A cached entry is always current, so conditional requests never load the session.
+    # Never hand out an ETag for a version that could still be lost in a crash: wait for
+    # this session's last answer only, and look again in case another one landed meanwhile
+    while True:
+        cached = summary_cache.get(user_id)
+        session = None
+        if cached is not None:
+            version, commit_seq = cached[0], cached[2]
+        else:
+            if user_id not in user_sessions:
+                raise HTTPException(status_code=404, detail="Session not found")
+            
+            session = user_sessions[user_id]
+            
+            if not session['performance_history']:
+                raise HTTPException(status_code=400, detail="No performance data available")
+            
+            # Summaries only change when an answer bumps the session version
+            version = session.get('version', len(session['performance_history']))
+            commit_seq = session.get('commit_seq', 0)
+        if event_log.is_committed(commit_seq):
+            break
+        await event_log.wait_committed(commit_seq)
+    
+    etag = f'"{user_id}-{version}{tag_suffix}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    body = cached[1].get(media_type) if cached is not None else None
+    if body is None:
+        if session is None:
+            session = user_sessions[user_id]
+        summary = build_session_summary(user_id, session)
+        body = packb(summary) if media_type == MSGPACK_MEDIA_TYPE else json.dumps(summary).encode('utf-8')
+        summary_cache.put(user_id, version, media_type, body, session.get('commit_seq', 0))
+    return Response(content=body, media_type=media_type, headers=headers)
+
+async def _iterate_on_event_loop(chunks):
+    # Keep session reads on the event loop thread; a sync iterator would run in a worker thread
+    for chunk in chunks:
+        yield chunk
+
+@app.get("/export/history")
+async def export_history(format: str = "csv"):
+    """Stream every session's answer history as CSV or Arrow IPC"""
+    if format == "csv":
+        return StreamingResponse(
+            _iterate_on_event_loop(export.iter_csv_chunks(user_sessions)),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=answer_history.csv"}
+        )
+    elif format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow export requires pyarrow")
+        return StreamingResponse(
+            _iterate_on_event_loop(export.iter_arrow_chunks(user_sessions)),
+            media_type="application/vnd.apache.arrow.stream",
+            headers={"Content-Disposition": "attachment; filename=answer_history.arrows"}
+        )
+    raise HTTPException(status_code=400, detail="Unsupported export format")
+
+@app.get("/event-log/stats")
+async def get_event_log_stats():
+    """Get event log replay throughput and commit statistics"""
+    return event_log.get_stats()
+
+@app.get("/session-cache/stats")
+async def get_session_cache_stats():
+    """Get resident vs. spilled session counts and summary cache usage"""
+    stats = user_sessions.get_stats()
+    stats['summary_cache'] = summary_cache.get_stats()
+    return stats
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "Math Adventures API is running"}
@@ -0,0 +1,80 @@
+import heapq
+
+
+class ReviewScheduler:
+    """Spaced review of missed puzzles, kept per learner as a min-heap.
+
+    Time is measured in answered questions, so a review "due at 12" comes back
+    once the learner has answered 12 questions. A miss is scheduled
+    ``min_interval`` questions ahead; each correct review doubles the interval
+    until it passes ``max_interval`` and the puzzle is retired. The heap lives in
+    ``session['review_queue']`` as ``[due, question, correct_answer, difficulty,
+    interval]`` lists, so it is snapshotted and spilled with the session.
+
+    Issuing a review only peeks at the heap: the entry stays queued until the
+    review is answered, so a skipped or abandoned puzzle comes back later.
+    """
+
+    def __init__(self, min_interval: int = 2, max_interval: int = 16, max_pending: int = 20):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_pending = max_pending
+
+    def next_due_review(self, session: dict):
+        """Return the most overdue review without removing it, or None if nothing is due.
+
+        Reviews are interleaved with fresh puzzles: never two reviews in a row.
+        """
+        queue = session.get('review_queue')
+        clock = len(session['performance_history'])
+        if not queue or queue[0][0] > clock or session.get('last_puzzle_review'):
+            session['last_puzzle_review'] = False
+            return None
+        session['last_puzzle_review'] = True
+        return list(queue[0])
+
+    def record_answer(self, session: dict, puzzle: dict, is_correct: bool):
+        """Schedule a missed puzzle, or push a correctly answered review further out"""
+        question = puzzle.get('question')
+        if question is None:
+            return
+        interval = puzzle.get('review_interval', 0)
+        # A review leaves the heap only once answered; if it is gone already, an
+        # earlier copy of the same review was answered and rescheduled it
+        if interval and not self._remove(session, puzzle):
+            return
+        if is_correct:
+            if not interval:
+                return
+            interval *= 2
+            if interval > self.max_interval:
+                return
+        else:
+            interval = self.min_interval
+
+        queue = session.setdefault('review_queue', [])
+        if len(queue) >= self.max_pending:
+            return
+        due = len(session['performance_history']) + interval
+        heapq.heappush(queue, [due, question, puzzle['correct_answer'], puzzle['difficulty'], interval])
+
+    def _remove(self, session: dict, puzzle: dict) -> bool:
+        """Remove the queued entry a review puzzle was issued from"""
+        queue = session.get('review_queue')
+        if not queue:
+            return False
+        key = [puzzle['question'], puzzle['correct_answer'], puzzle['difficulty'], puzzle['review_interval']]
+        # Reviews are issued from the top of the heap, so this is normally an O(log n) pop
+        if queue[0][1:] == key:
+            heapq.heappop(queue)
+            return True
+        # Another entry reached the top since it was issued (e.g. one sharing its due time)
+        matches = [i for i, entry in enumerate(queue) if entry[1:] == key]
+        if not matches:
+            return False
+        index = min(matches, key=lambda i: queue[i][0])
+        last = queue.pop()
+        if index < len(queue):
+            queue[index] = last
+            heapq.heapify(queue)
+        return True
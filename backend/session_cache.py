@@ -0,0 +1,302 @@
+import json
+import os
+import shutil
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import quote
+from models import Difficulty
+
+# Rough per-object costs used to estimate the RAM held by a session dict
+_SESSION_BASE_BYTES = 1024
+_HISTORY_ENTRY_BYTES = 300
+# Rough cost of a summary cache entry besides its serialized bodies
+_SUMMARY_ENTRY_BYTES = 200
+
+
+def estimate_session_bytes(session: dict) -> int:
+    """Cheap O(1) estimate of the memory held by a session"""
+    return _SESSION_BASE_BYTES + _HISTORY_ENTRY_BYTES * len(session.get('performance_history', ()))
+
+
+class SessionCache:
+    """Dict-like session store with an LRU-bounded resident set.
+
+    When the number of resident sessions or their estimated size exceeds the
+    budget, the least recently used sessions are written to ``spill_dir`` as
+    compressed JSON and dropped from RAM. Looking a spilled session up pages it
+    back in transparently. Iterating with ``items()`` does not count as use and
+    does not promote spilled sessions. ``on_spill`` is called with the user id
+    of every session moved out of RAM.
+
+    Creating a cache does not touch the disk; call ``clear()`` before use to
+    start from an empty ``spill_dir``.
+    """
+
+    def __init__(self, spill_dir: str, max_sessions: int = None, max_bytes: int = None, on_spill=None):
+        self.spill_dir = spill_dir
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.on_spill = on_spill
+
+        self._resident = OrderedDict()
+        self._sizes = {}
+        self._last_access = {}
+        self._spilled = set()
+        self.resident_bytes = 0
+
+        self.evictions = 0
+        self.page_ins = 0
+        self.idle_spills = 0
+
+    # ------------------------------------------------------------------
+    # Mapping interface
+    # ------------------------------------------------------------------
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._resident or user_id in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._resident) + len(self._spilled)
+
+    def __iter__(self):
+        yield from list(self._resident)
+        yield from list(self._spilled)
+
+    def __getitem__(self, user_id) -> dict:
+        if user_id in self._resident:
+            self._resident.move_to_end(user_id)
+            session = self._resident[user_id]
+            self._resize(user_id, session)
+        elif user_id in self._spilled:
+            session = self._page_in(user_id)
+        else:
+            raise KeyError(user_id)
+        self._last_access[user_id] = time.monotonic()
+        self._enforce_budget(keep=user_id)
+        return session
+
+    def __setitem__(self, user_id, session: dict):
+        if user_id in self._spilled:
+            self._spilled.discard(user_id)
+            os.remove(self._spill_path(user_id))
+        self._resident[user_id] = session
+        self._resident.move_to_end(user_id)
+        self._resize(user_id, session)
+        self._last_access[user_id] = time.monotonic()
+        self._enforce_budget(keep=user_id)
+
+    def __delitem__(self, user_id):
+        if user_id in self._resident:
+            del self._resident[user_id]
+            self.resident_bytes -= self._sizes.pop(user_id)
+            del self._last_access[user_id]
+        elif user_id in self._spilled:
+            self._spilled.discard(user_id)
+            os.remove(self._spill_path(user_id))
+        else:
+            raise KeyError(user_id)
+
+    def update(self, sessions: dict):
+        """Insert many sessions at once, enforcing the budget a single time at the end"""
+        now = time.monotonic()
+        for user_id, session in sessions.items():
+            if user_id in self._spilled:
+                self._spilled.discard(user_id)
+                os.remove(self._spill_path(user_id))
+            self._resident[user_id] = session
+            self._resident.move_to_end(user_id)
+            self._resize(user_id, session)
+            self._last_access[user_id] = now
+        self._enforce_budget()
+
+    def get(self, user_id, default=None):
+        if user_id not in self:
+            return default
+        return self[user_id]
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        """Yield every session without changing recency or residency"""
+        # Sessions may move between RAM and disk while a lazy consumer is paused
+        seen = set()
+        for user_id, session in list(self._resident.items()):
+            seen.add(user_id)
+            yield user_id, session
+        for user_id in list(self._spilled):
+            if user_id in seen:
+                continue
+            if user_id in self._spilled:
+                yield user_id, self._read_spilled(user_id)
+            elif user_id in self._resident:
+                yield user_id, self._resident[user_id]
+
+    def values(self):
+        for _, session in self.items():
+            yield session
+
+    def clear(self):
+        """Drop every session and empty the spill directory"""
+        self._resident.clear()
+        self._sizes.clear()
+        self._last_access.clear()
+        self._spilled.clear()
+        self.resident_bytes = 0
+        # Spilled sessions only live as long as the process; durable state is elsewhere
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+
+    def sweep_idle(self, max_idle_seconds: float) -> int:
+        """Spill every resident session that has not been used for ``max_idle_seconds``"""
+        cutoff = time.monotonic() - max_idle_seconds
+        # Resident sessions are kept in LRU order, so idle ones are at the front
+        idle = []
+        for user_id in self._resident:
+            if self._last_access[user_id] > cutoff:
+                break
+            idle.append(user_id)
+        for user_id in idle:
+            self._spill(user_id)
+        self.idle_spills += len(idle)
+        return len(idle)
+
+    def _over_budget(self) -> bool:
+        if self.max_sessions is not None and len(self._resident) > self.max_sessions:
+            return True
+        if self.max_bytes is not None and self.resident_bytes > self.max_bytes:
+            return True
+        return False
+
+    def _enforce_budget(self, keep=None):
+        while self._over_budget() and len(self._resident) > 1:
+            user_id = next(iter(self._resident))
+            if user_id == keep:
+                break
+            self._spill(user_id)
+            self.evictions += 1
+
+    def _resize(self, user_id, session: dict):
+        size = estimate_session_bytes(session)
+        self.resident_bytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+
+    # ------------------------------------------------------------------
+    # On-disk form
+    # ------------------------------------------------------------------
+
+    def _spill_path(self, user_id) -> str:
+        return os.path.join(self.spill_dir, quote(str(user_id), safe='') + '.bin')
+
+    def _spill(self, user_id):
+        session = self._resident.pop(user_id)
+        self.resident_bytes -= self._sizes.pop(user_id)
+        del self._last_access[user_id]
+        data = zlib.compress(json.dumps(session, separators=(',', ':')).encode('utf-8'))
+        with open(self._spill_path(user_id), 'wb') as f:
+            f.write(data)
+        self._spilled.add(user_id)
+        if self.on_spill is not None:
+            self.on_spill(user_id)
+
+    def _read_spilled(self, user_id) -> dict:
+        with open(self._spill_path(user_id), 'rb') as f:
+            session = json.loads(zlib.decompress(f.read()))
+        session['current_difficulty'] = Difficulty(session['current_difficulty'])
+        return session
+
+    def _page_in(self, user_id) -> dict:
+        session = self._read_spilled(user_id)
+        os.remove(self._spill_path(user_id))
+        self._spilled.discard(user_id)
+        self._resident[user_id] = session
+        self._resize(user_id, session)
+        self.page_ins += 1
+        return session
+
+    def get_stats(self) -> dict:
+        """Resident vs. spilled session counts and eviction counters"""
+        return {
+            'resident_sessions': len(self._resident),
+            'spilled_sessions': len(self._spilled),
+            'resident_bytes_estimate': self.resident_bytes,
+            'max_sessions': self.max_sessions,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'idle_spills': self.idle_spills,
+            'page_ins': self.page_ins,
+        }
+
+
+class SummaryCache:
+    """LRU cache of serialized session summaries, bounded by their size in bytes.
+
+    Entries are ``[version, {media type: body}, commit_seq]``, where ``commit_seq``
+    is the event log sequence number of the write that produced the version.
+    Callers drop an entry whenever the session changes, so a cached version is
+    always the current one and can answer conditional requests without loading
+    the session. ``drop_bodies`` keeps just the version, for sessions that were
+    spilled out of RAM.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.bytes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id):
+        """Return ``[version, bodies, commit_seq]`` for ``user_id`` or None, marking it recently used"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+        return entry
+
+    def put(self, user_id, version, media_type: str, body: bytes, commit_seq: int = 0):
+        """Cache one representation of a summary, replacing any older version"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != version:
+            entry = [version, {}, commit_seq]
+            self._entries[user_id] = entry
+        entry[1][media_type] = body
+        self._entries.move_to_end(user_id)
+        self._resize(user_id, entry)
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == user_id:
+                break
+            self.discard(oldest)
+            self.evictions += 1
+
+    def drop_bodies(self, user_id):
+        """Free the serialized bodies but remember which version they were for"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            entry[1].clear()
+            self._resize(user_id, entry)
+
+    def discard(self, user_id):
+        if self._entries.pop(user_id, None) is not None:
+            self.bytes -= self._sizes.pop(user_id)
+
+    def _resize(self, user_id, entry):
+        size = _SUMMARY_ENTRY_BYTES + sum(len(body) for body in entry[1].values())
+        self.bytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+
+    def get_stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+        }
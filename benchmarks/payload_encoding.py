@@ -0,0 +1,88 @@
+"""Payload size and encode/decode CPU of JSON vs. MessagePack for API payloads.
+
+Payloads mirror what the API actually sends: a puzzle, an answer request and
+response, session summaries of growing length and a bulk class provisioning
+response.
+
+    python benchmarks/payload_encoding.py
+    python benchmarks/payload_encoding.py --number 20000
+"""
+import argparse
+import json
+import random
+import timeit
+import uuid
+
+import msgpack
+
+DIFFICULTIES = ["EASY", "MEDIUM", "HARD"]
+
+
+def sample_payloads():
+    user_id = str(uuid.uuid4())
+    payloads = {
+        'puzzle response': {
+            "question": "48 ÷ 6 = ?", "correct_answer": 8, "difficulty": "HARD",
+            "puzzle_id": "a1b2c3d4", "is_review": False
+        },
+        'answer request': {
+            "user_id": user_id, "puzzle_id": "a1b2c3d4", "user_answer": 8.0,
+            "response_time": 3.2741
+        },
+        'answer response': {
+            "is_correct": True, "correct_answer": 8, "next_difficulty": "HARD",
+            "performance_stats": {
+                "total_questions": 42, "correct_answers": 31, "accuracy": 31 / 42,
+                "current_difficulty": "HARD"
+            }
+        },
+    }
+    for length in (10, 100, 1000):
+        payloads[f'summary ({length} answers)'] = {
+            "user_id": user_id, "total_questions": length, "correct_answers": int(length * 0.7),
+            "accuracy": 0.7, "average_response_time": 4.83,
+            "difficulty_history": [random.choice(DIFFICULTIES) for _ in range(length)],
+            "recommendation": "Good progress! Keep practicing to improve consistency."
+        }
+    payloads['start-sessions (40 students)'] = {
+        "class_id": str(uuid.uuid4()),
+        "user_ids": [str(uuid.uuid4()) for _ in range(40)],
+        "initial_difficulties": [random.choice(DIFFICULTIES) for _ in range(40)],
+        "message": "40 sessions started successfully"
+    }
+    return payloads
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and MessagePack for API payloads")
+    parser.add_argument('--number', type=int, default=5000, help="Calls per timing run")
+    args = parser.parse_args()
+
+    random.seed(0)
+    header = (f"{'payload':<30} {'json B':>8} {'msgpack B':>10} {'size':>6} "
+              f"{'json enc us':>12} {'mp enc us':>10} {'json dec us':>12} {'mp dec us':>10}")
+    print(header)
+    print('-' * len(header))
+
+    for name, payload in sample_payloads().items():
+        # Encode the way the API does: JSONResponse renders compact UTF-8
+        json_body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        msgpack_body = msgpack.packb(payload, use_bin_type=True)
+
+        json_encode = per_call_us(
+            lambda: json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), args.number)
+        msgpack_encode = per_call_us(lambda: msgpack.packb(payload, use_bin_type=True), args.number)
+        json_decode = per_call_us(lambda: json.loads(json_body), args.number)
+        msgpack_decode = per_call_us(lambda: msgpack.unpackb(msgpack_body, raw=False), args.number)
+
+        print(f"{name:<30} {len(json_body):>8} {len(msgpack_body):>10} "
+              f"{len(msgpack_body) / len(json_body):>6.0%} "
+              f"{json_encode:>12.2f} {msgpack_encode:>10.2f} {json_decode:>12.2f} {msgpack_decode:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
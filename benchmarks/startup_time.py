@@ -0,0 +1,107 @@
+"""Cold-start import benchmark for the backend and frontend entry points.
+
+Each entry point is imported in a fresh interpreter under ``python -X importtime``
+so nothing is cached between runs. The cumulative import time of the entry
+module is checked against a budget, and modules that should only load on first
+use must not show up at all.
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --runs 5 --backend-budget 1.5 --frontend-budget 2.5
+
+Exits with status 1 if any entry point is over budget.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    'backend': {
+        'directory': os.path.join(ROOT, 'backend'),
+        'module': 'main',
+        'lazy_modules': ['uvicorn', 'pyarrow'],
+    },
+    'frontend': {
+        'directory': os.path.join(ROOT, 'frontend'),
+        'module': 'app',
+        # Streamlit itself imports the top-level plotly package, so check plotly.express
+        'lazy_modules': ['pandas', 'plotly.express'],
+    },
+}
+
+
+def measure_import(directory: str, module: str):
+    """Import ``module`` in a fresh interpreter.
+
+    Returns the cumulative seconds for ``module`` and the (name, seconds, depth)
+    records of everything imported beneath it.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=directory, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <2 spaces per nesting level><module>"
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        records.append((name.strip(), int(cumulative_us) / 1e6, depth))
+
+    # Children are reported before their parent, so the subtree of the entry
+    # module is everything between it and the previous top-level import
+    end = max(i for i, (name, _, depth) in enumerate(records) if name == module and depth == 0)
+    start = end
+    while start > 0 and records[start - 1][2] > 0:
+        start -= 1
+    return records[end][1], records[start:end]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the entry points")
+    parser.add_argument('--runs', type=int, default=3, help="Fresh interpreters per entry point")
+    parser.add_argument('--backend-budget', type=float, default=1.5, help="Seconds")
+    parser.add_argument('--frontend-budget', type=float, default=2.5, help="Seconds")
+    parser.add_argument('--top', type=int, default=10, help="Slowest top-level imports to show")
+    args = parser.parse_args()
+
+    budgets = {'backend': args.backend_budget, 'frontend': args.frontend_budget}
+    failed = False
+
+    for name, entry in ENTRY_POINTS.items():
+        timings = []
+        subtree = []
+        for _ in range(args.runs):
+            seconds, subtree = measure_import(entry['directory'], entry['module'])
+            timings.append(seconds)
+        median = statistics.median(timings)
+        over_budget = median > budgets[name]
+        imported = {module for module, _, _ in subtree}
+        eager = [m for m in entry['lazy_modules']
+                 if m in imported or any(module.startswith(m + '.') for module in imported)]
+
+        print(f"{name} ({entry['module']}): median {median:.3f}s over {args.runs} runs, "
+              f"budget {budgets[name]:.3f}s -> {'FAIL' if over_budget else 'ok'}")
+        # Direct imports of the entry module, slowest first
+        direct = sorted(((seconds, module) for module, seconds, depth in subtree if depth == 1),
+                        reverse=True)
+        for seconds, module in direct[:args.top]:
+            print(f"    {seconds:8.3f}s  {module}")
+        if eager:
+            print(f"    imported eagerly but should load on first use: {', '.join(eager)}")
+
+        failed = failed or over_budget or bool(eager)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
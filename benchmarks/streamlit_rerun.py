@@ -0,0 +1,184 @@
+"""Headless benchmark of Streamlit rerun latency for the puzzle loop.
+
+Drives ``frontend/app.py`` through Streamlit's app-testing harness the way a
+learner would (Get New Puzzle -> Submit Answer -> Continue) against an
+in-process stub of the backend API, so no server has to be running. Every
+script run is timed, and so are the app functions called during it.
+
+    python benchmarks/streamlit_rerun.py
+    python benchmarks/streamlit_rerun.py --sizes 10 100 --tail 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import requests
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRONTEND_DIR = os.path.join(ROOT, 'frontend')
+
+# App functions whose cumulative time is reported per script run
+TIMED_FUNCTIONS = ['main', 'display_puzzle_interface', 'display_feedback', 'display_analytics']
+
+# Script executed by AppTest: imports the real app once, wraps the timed
+# functions and runs main(). The app module stays cached between reruns.
+SCRIPT = f"""
+import sys
+import time
+if {FRONTEND_DIR!r} not in sys.path:
+    sys.path.insert(0, {FRONTEND_DIR!r})
+import app
+
+if not hasattr(app, '_bench_timings'):
+    app._bench_timings = {{}}
+
+    def _timed(name, func):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                app._bench_timings.setdefault(name, []).append(time.perf_counter() - started)
+        return wrapper
+
+    for _name in {TIMED_FUNCTIONS!r}:
+        setattr(app, _name, _timed(_name, getattr(app, _name)))
+
+app.main()
+"""
+
+
+class StubResponse:
+    def __init__(self, payload, status_code: int = 200):
+        self.status_code = status_code
+        self.headers = {}
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class StubBackend:
+    """In-process stand-in for the FastAPI backend, answering the frontend's requests"""
+
+    def __init__(self, accuracy: float = 0.7, seed: int = 0):
+        self.random = random.Random(seed)
+        self.accuracy = accuracy
+        self.puzzles = {}
+        self.difficulty = "MEDIUM"
+        self.answered = 0
+        self.correct = 0
+
+    def post(self, url, params=None, json=None, **kwargs):
+        path = url.rsplit('/', 1)[-1]
+        if path == 'start-session':
+            self.difficulty = params['difficulty']
+            return StubResponse({"user_id": "bench-user", "message": "Session started successfully",
+                                 "initial_difficulty": self.difficulty})
+        if path == 'get-puzzle':
+            a, b = self.random.randint(1, 50), self.random.randint(1, 50)
+            puzzle_id = f"p{len(self.puzzles)}"
+            self.puzzles[puzzle_id] = a + b
+            return StubResponse({"question": f"{a} + {b} = ?", "correct_answer": a + b,
+                                 "difficulty": self.difficulty, "puzzle_id": puzzle_id})
+        if path == 'submit-answer':
+            correct_answer = self.puzzles.pop(json['puzzle_id'])
+            is_correct = abs(json['user_answer'] - correct_answer) < 0.001
+            self.answered += 1
+            self.correct += is_correct
+            return StubResponse({
+                "is_correct": is_correct,
+                "correct_answer": correct_answer,
+                "next_difficulty": self.difficulty,
+                "performance_stats": {
+                    "total_questions": self.answered,
+                    "correct_answers": self.correct,
+                    "accuracy": self.correct / self.answered,
+                    "current_difficulty": self.difficulty
+                }
+            })
+        return StubResponse({"detail": "Not found"}, status_code=404)
+
+    def get(self, url, **kwargs):
+        return StubResponse({"detail": "Not found"}, status_code=404)
+
+    def answer_for(self, puzzle_id: str) -> float:
+        correct_answer = self.puzzles[puzzle_id]
+        return float(correct_answer if self.random.random() < self.accuracy else correct_answer + 1)
+
+
+def run_session(answers: int, tail: int, timeout: float) -> dict:
+    """Play one session of ``answers`` answers; return rerun and per-function timings"""
+    backend = StubBackend()
+    original_post, original_get = requests.post, requests.get
+    requests.post, requests.get = backend.post, backend.get
+    sys.modules.pop('app', None)
+    try:
+        at = AppTest.from_string(SCRIPT, default_timeout=timeout)
+        at.run()
+        at.button(key="medium_btn").click().run()
+
+        interaction_times = []
+        for _ in range(answers):
+            step_times = []
+            started = time.perf_counter()
+            at.button(key="get_puzzle").click().run()
+            step_times.append(time.perf_counter() - started)
+
+            puzzle_id = at.session_state['current_puzzle']['puzzle_id']
+            at.number_input(key="answer_input").set_value(backend.answer_for(puzzle_id))
+            started = time.perf_counter()
+            at.button(key="submit_btn").click().run()
+            step_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            at.button(key="continue_btn").click().run()
+            step_times.append(time.perf_counter() - started)
+            interaction_times.append(step_times)
+
+        if at.exception:
+            raise RuntimeError(f"app raised during benchmark: {at.exception}")
+        timings = sys.modules['app']._bench_timings
+    finally:
+        requests.post, requests.get = original_post, original_get
+
+    script_runs = len(timings['main'])
+    flat = [t for steps in interaction_times for t in steps]
+    tail_flat = [t for steps in interaction_times[-tail:] for t in steps]
+    return {
+        'answers': answers,
+        'interactions': len(flat),
+        'script_runs': script_runs,
+        'interaction_ms': statistics.mean(flat) * 1e3,
+        'tail_interaction_ms': statistics.mean(tail_flat) * 1e3,
+        'script_run_ms': sum(timings['main']) / script_runs * 1e3,
+        'functions': {
+            name: (sum(timings.get(name, [])) / script_runs * 1e3, len(timings.get(name, [])))
+            for name in TIMED_FUNCTIONS
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Streamlit rerun latency as sessions grow")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help="Answers per session")
+    parser.add_argument('--tail', type=int, default=10, help="Final answers used for the at-length figure")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Seconds allowed per script run")
+    args = parser.parse_args()
+
+    for answers in args.sizes:
+        result = run_session(answers, args.tail, args.timeout)
+        print(f"{answers} answers: {result['interactions']} interactions, {result['script_runs']} script runs")
+        print(f"    per interaction: {result['interaction_ms']:.1f} ms mean, "
+              f"{result['tail_interaction_ms']:.1f} ms over the last {min(args.tail, answers)} answers")
+        print(f"    per script run:  {result['script_run_ms']:.1f} ms in main()")
+        for name, (ms_per_run, calls) in result['functions'].items():
+            print(f"        {name:<26} {ms_per_run:8.2f} ms/run  ({calls} calls)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,6 @@
 import streamlit as st
 import requests
 import time
-import pandas as pd
-import plotly.express as px
 from datetime import datetime
 
 # API configuration
@@ -114,9 +112,23 @@ def get_session_summary():
         return None
     
     try:
-        response = requests.get(f"{API_BASE_URL}/session-summary/{st.session_state.user_id}")
-        if response.status_code == 200:
-            return response.json()
+        # Revalidate the last summary instead of downloading it again
+        cached = st.session_state.get('summary_cache')
+        headers = {}
+        if cached and cached['user_id'] == st.session_state.user_id:
+            headers["If-None-Match"] = cached['etag']
+        
+        response = requests.get(f"{API_BASE_URL}/session-summary/{st.session_state.user_id}", headers=headers)
+        if response.status_code == 304:
+            return cached['summary']
+        elif response.status_code == 200:
+            summary = response.json()
+            st.session_state.summary_cache = {
+                'user_id': st.session_state.user_id,
+                'etag': response.headers.get("ETag"),
+                'summary': summary
+            }
+            return summary
         else:
             return None
     except:
@@ -199,6 +211,8 @@ def display_puzzle_interface():
         puzzle = st.session_state.current_puzzle
         
         # Display puzzle in a clean layout
+        if puzzle.get('is_review'):
+            st.caption("🔁 Review: you missed this one earlier")
         st.markdown(f"### {puzzle['question']}")
         
         # Answer input
@@ -262,6 +276,13 @@ def display_analytics():
     
     st.header("📊 Performance Analytics")
     
+    # pandas and plotly are only needed once analytics show up; import them lazily
+    # so a fresh worker does not pay for them on the welcome page
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from charts import lttb, box_summary
+    
     # Convert to DataFrame
     df = pd.DataFrame(st.session_state.performance_history)
     df['question_number'] = range(1, len(df) + 1)
@@ -269,25 +290,51 @@ def display_analytics():
     # Accuracy over time chart
     df['cumulative_accuracy'] = df['is_correct'].expanding().mean()
     
+    # Long sessions are downsampled so the chart stays under a fixed point budget
     st.subheader("Accuracy Progress Over Time")
+    question_numbers, accuracies = lttb(df['question_number'], df['cumulative_accuracy'])
     fig_accuracy = px.line(
-        df, 
-        x='question_number', 
-        y='cumulative_accuracy',
+        x=question_numbers, 
+        y=accuracies,
         title='',
-        labels={'question_number': 'Question Number', 'cumulative_accuracy': 'Accuracy'}
+        labels={'x': 'Question Number', 'y': 'Accuracy'}
     )
     fig_accuracy.update_layout(yaxis_tickformat='.0%')
     st.plotly_chart(fig_accuracy, use_container_width=True)
     
     # Response time and difficulty charts in separate sections
+    # Boxes are drawn from precomputed quartiles instead of every raw response time
     st.subheader("Response Time Analysis")
-    fig_time = px.box(
-        df, 
-        x='difficulty', 
-        y='response_time',
+    fig_time = go.Figure()
+    times_by_difficulty = dict(tuple(df.groupby('difficulty', sort=False)['response_time']))
+    for difficulty in ["EASY", "MEDIUM", "HARD"]:
+        if difficulty not in times_by_difficulty:
+            continue
+        summary = box_summary(times_by_difficulty[difficulty])
+        fig_time.add_trace(go.Box(
+            name=difficulty,
+            q1=[summary['q1']],
+            median=[summary['median']],
+            q3=[summary['q3']],
+            lowerfence=[summary['lowerfence']],
+            upperfence=[summary['upperfence']],
+            mean=[summary['mean']],
+            hovertext=f"{summary['count']} answers, {summary['outlier_count']} outliers"
+        ))
+        # Outliers beyond the fences, capped so long sessions stay within the point budget
+        if len(summary['outliers']):
+            fig_time.add_trace(go.Scatter(
+                x=[difficulty] * len(summary['outliers']),
+                y=summary['outliers'],
+                mode='markers',
+                marker=dict(size=5),
+                hovertemplate="%{y:.1f}s<extra></extra>"
+            ))
+    fig_time.update_layout(
         title='Response Time by Difficulty Level',
-        labels={'difficulty': 'Difficulty', 'response_time': 'Response Time (seconds)'}
+        xaxis_title='Difficulty',
+        yaxis_title='Response Time (seconds)',
+        showlegend=False
     )
     st.plotly_chart(fig_time, use_container_width=True)
     
@@ -0,0 +1,77 @@
+"""Downsampling helpers that keep analytics charts under a fixed point budget"""
+import numpy as np
+
+# Largest number of points sent to the browser for a single line
+LINE_POINT_BUDGET = 500
+# Largest number of outliers drawn as points next to a precomputed box
+OUTLIER_POINT_BUDGET = 50
+
+
+def lttb(x, y, threshold: int = LINE_POINT_BUDGET):
+    """Largest-Triangle-Three-Buckets downsampling of a line.
+
+    Keeps the first and last points and, for every bucket in between, the point
+    forming the largest triangle with the previously kept point and the average
+    of the next bucket. Returns ``(x, y)`` arrays with at most ``threshold`` points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket (just the last point for the final bucket)
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Twice the triangle area for every candidate in this bucket
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return x[selected], y[selected]
+
+
+def box_summary(values, max_outliers: int = OUTLIER_POINT_BUDGET) -> dict:
+    """Quartiles and Tukey fences for a precomputed box plot.
+
+    Fences never fall inside the box. Values beyond them are counted in
+    ``outlier_count``; the ``max_outliers`` furthest from the median are
+    returned in ``outliers`` so they can be drawn as points.
+    """
+    values = np.asarray(values, dtype=float)
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    is_inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    inside = values[is_inside]
+    outliers = values[~is_inside]
+    if len(outliers) > max_outliers:
+        outliers = outliers[np.argsort(np.abs(outliers - median))[-max_outliers:]]
+    return {
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'lowerfence': min(inside.min(), q1),
+        'upperfence': max(inside.max(), q3),
+        'mean': values.mean(),
+        'count': len(values),
+        'outliers': outliers,
+        'outlier_count': int((~is_inside).sum()),
+    }
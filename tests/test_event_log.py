@@ -0,0 +1,145 @@
+import copy
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from event_log import EventLog, RecoveryError, encode_session_started
+from models import Difficulty
+from review_scheduler import ReviewScheduler
+from session_cache import SessionCache, SummaryCache
+
+
+def replay(directory, review_scheduler=None):
+    """Load everything logged in ``directory`` into fresh state"""
+    sessions, puzzles, classes = {}, {}, {}
+    log = EventLog(directory, review_scheduler=review_scheduler)
+    next_segment = log.load(sessions, puzzles, classes)
+    return sessions, puzzles, classes, next_segment
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith('events-'))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """The API running against an empty data directory under ``tmp_path``"""
+    data_dir = str(tmp_path / 'data')
+    summary_cache = SummaryCache(max_bytes=1 << 20)
+    monkeypatch.setattr(main, 'summary_cache', summary_cache)
+    monkeypatch.setattr(main, 'user_sessions', SessionCache(os.path.join(data_dir, 'spill'),
+                                                            on_spill=summary_cache.drop_bodies))
+    monkeypatch.setattr(main, 'active_puzzles', {})
+    monkeypatch.setattr(main, 'class_sessions', {})
+    monkeypatch.setattr(main, 'event_log', EventLog(data_dir, review_scheduler=main.review_scheduler))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def answer(client, user_id, correct):
+    puzzle = client.post('/get-puzzle', json={'user_id': user_id}).json()
+    user_answer = puzzle['correct_answer'] if correct else -1
+    response = client.post('/submit-answer', json={
+        'user_id': user_id, 'puzzle_id': puzzle['puzzle_id'], 'user_answer': user_answer, 'response_time': 3.5
+    })
+    assert response.status_code == 200
+    return puzzle
+
+
+def test_replay_rebuilds_live_state(client):
+    solo = client.post('/start-session', params={'difficulty': 'EASY'}).json()['user_id']
+    provisioned = client.post('/start-sessions', json={'class_id': 'class-a', 'difficulties': ['EASY', 'HARD']}).json()
+    learners = [solo] + provisioned['user_ids']
+
+    # Misses schedule reviews, later answers serve and reschedule them, and a few
+    # puzzles are fetched without being answered
+    served_review = False
+    for round_number in range(12):
+        for index, user_id in enumerate(learners):
+            puzzle = answer(client, user_id, correct=(round_number + index) % 3 != 0)
+            served_review = served_review or puzzle['is_review']
+        client.post('/get-puzzle', json={'user_id': learners[round_number % len(learners)]})
+    assert served_review
+
+    live_sessions = {user_id: copy.deepcopy(session) for user_id, session in main.user_sessions.items()}
+    for session in live_sessions.values():
+        # Process-local bookkeeping, never logged
+        session.pop('commit_seq', None)
+    assert any(session.get('review_queue') for session in live_sessions.values())
+    main.event_log.flush()
+
+    sessions, puzzles, classes, _ = replay(main.event_log.directory, ReviewScheduler())
+    assert sessions == live_sessions
+    assert puzzles == main.active_puzzles
+    assert classes == main.class_sessions == {'class-a': provisioned['user_ids']}
+
+
+def test_torn_tail_is_dropped_and_never_appended_to(tmp_path):
+    directory = str(tmp_path)
+    log = EventLog(directory)
+    log.open({}, {})
+    for user_id in ('u1', 'u2', 'u3'):
+        log.session_started(user_id, Difficulty.MEDIUM)
+    log.close()
+
+    # Cut the last record off halfway through its payload
+    path = os.path.join(directory, segment_files(directory)[0])
+    last_record = len(encode_session_started('u3', Difficulty.MEDIUM))
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - last_record // 2)
+
+    sessions, _, _, next_segment = replay(directory)
+    assert sorted(sessions) == ['u1', 'u2']
+    assert next_segment == 1
+
+    log = EventLog(directory)
+    log.open({}, {})
+    log.session_started('u4', Difficulty.HARD)
+    log.close()
+    assert segment_files(directory) == ['events-00000000.log', 'events-00000001.log']
+    sessions, _, _, _ = replay(directory)
+    assert sorted(sessions) == ['u1', 'u2', 'u4']
+    assert sessions['u4']['current_difficulty'] == Difficulty.HARD
+
+
+def test_snapshot_compacts_and_reloads(tmp_path):
+    directory = str(tmp_path)
+    sessions, puzzles, classes = {}, {}, {}
+    log = EventLog(directory)
+    log.open(sessions, puzzles, classes)
+    log.sessions_started('class-a', [('u1', Difficulty.EASY), ('u2', Difficulty.MEDIUM)])
+    log.puzzle_issued('p1', 'u1', 'EASY', 7, '3 + 4 = ?')
+    log.session_started('u3', Difficulty.HARD)
+    log.snapshot()
+    # Events after the snapshot land in the new segment and are replayed on top of it
+    log.session_started('u4', Difficulty.EASY)
+    log.close()
+
+    assert segment_files(directory) == ['events-00000001.log']
+    assert os.path.exists(os.path.join(directory, 'snapshot-00000001.jsonl'))
+
+    sessions, puzzles, classes, next_segment = replay(directory)
+    assert sorted(sessions) == ['u1', 'u2', 'u3', 'u4']
+    assert sessions['u2']['class_id'] == 'class-a'
+    assert sessions['u2']['current_difficulty'] == Difficulty.MEDIUM
+    assert puzzles['p1']['correct_answer'] == 7
+    assert classes == {'class-a': ['u1', 'u2']}
+    assert next_segment == 2
+
+
+def test_unreadable_snapshot_fails_loudly(tmp_path):
+    directory = str(tmp_path)
+    log = EventLog(directory)
+    log.open({}, {})
+    log.session_started('u1', Difficulty.EASY)
+    log.snapshot()
+    log.session_started('u2', Difficulty.EASY)
+    log.close()
+
+    with open(os.path.join(directory, 'snapshot-00000001.jsonl'), 'w') as f:
+        f.write('{"segment": 1, "puzz')
+
+    with pytest.raises(RecoveryError):
+        replay(directory)
@@ -0,0 +1,49 @@
+import csv
+import io
+
+import pytest
+
+import export
+
+
+def make_sessions():
+    return {
+        'u1': {'performance_history': [
+            {'is_correct': True, 'response_time': 2.5, 'difficulty': 'EASY'},
+            {'is_correct': False, 'response_time': 7.0, 'difficulty': 'MEDIUM'},
+        ]},
+        'u2': {'performance_history': [
+            {'is_correct': True, 'response_time': 4.0, 'difficulty': 'HARD'},
+            {'is_correct': True, 'response_time': 3.0, 'difficulty': 'EASY'},
+        ]},
+    }
+
+
+def test_csv_export_has_one_row_per_answer():
+    text = ''.join(export.iter_csv_chunks(make_sessions(), batch_rows=1))
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == export.EXPORT_COLUMNS
+    assert rows[1:] == [
+        ['u1', '1', 'True', '2.5', 'EASY'],
+        ['u1', '2', 'False', '7.0', 'MEDIUM'],
+        ['u2', '1', 'True', '4.0', 'HARD'],
+        ['u2', '2', 'True', '3.0', 'EASY'],
+    ]
+
+
+def test_parquet_export_reads_back_as_a_dataset(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet', exc_type=ImportError)
+
+    rows_written = export.write_parquet(make_sessions(), str(tmp_path), batch_rows=1, rows_per_file=1)
+    assert rows_written == {'EASY': 2, 'MEDIUM': 1, 'HARD': 1}
+    assert sorted(p.name for p in (tmp_path / 'difficulty=EASY').iterdir()) == \
+        ['part-00000.parquet', 'part-00001.parquet']
+
+    table = pq.read_table(str(tmp_path))
+    rows = sorted(zip(*(table.column(name).to_pylist() for name in export.EXPORT_COLUMNS)))
+    assert rows == [
+        ('u1', 1, True, 2.5, 'EASY'),
+        ('u1', 2, False, 7.0, 'MEDIUM'),
+        ('u2', 1, True, 4.0, 'HARD'),
+        ('u2', 2, True, 3.0, 'EASY'),
+    ]